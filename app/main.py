@@ -4,22 +4,42 @@ Images are organized into albums.
 Each album has associated with it a "starred" or "favorited" image.
 """
 
+import contextlib
+import hashlib
 import os
-import secrets
-from typing import Annotated
-
+import shutil
+import sys
+import tempfile
+from collections.abc import Iterable
+from typing import Annotated, BinaryIO
+
+import anyio
+import cachetools
 import fastapi
 import sqlalchemy
 import sqlmodel
 from fastapi.middleware.cors import CORSMiddleware
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlmodel import Field, SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 BASE_DIR = os.path.abspath(os.path.dirname(__name__))
 IMAGES_DIR = os.path.join(BASE_DIR, "images")
+COPY_CHUNK_SIZE = 64 * 1024
+# Accepted upload media types and the extension their files are saved with.
+# Files are served with the media type "image/<extension>".
+IMAGE_EXTENSIONS = {
+    "image/jpeg": "jpeg",
+    "image/jpg": "jpeg",
+    "image/png": "png",
+    "image/webp": "webp",
+    "image/gif": "gif",
+    "image/avif": "avif",
+}
 
 
 class ImageBase(SQLModel):
-    album: int = Field(default=0, index=True)
+    album: int = Field(default=0)
     starred: bool = Field(default=False, index=False)
 
 
@@ -33,8 +53,19 @@ class Image(ImageBase, table=True):
         filepath: location of the file on disk
     """
 
+    # ix_image_album_id holds every column get_album selects, in id order, so the
+    # listing is read from the index alone. ix_image_starred only holds the one
+    # starred image per album; queries must compare starred to a literal true
+    # (not a bound parameter) for SQLite to use it.
+    __table_args__ = (
+        sqlalchemy.Index("ix_image_album_id", "album", "id", "starred"),
+        sqlalchemy.Index(
+            "ix_image_starred", "album", sqlite_where=sqlalchemy.text("starred = 1")
+        ),
+    )
+
     id: int | None = Field(default=None, primary_key=True)
-    filepath: str | None = Field(default=None)
+    filepath: str | None = Field(default=None, index=True)
 
 
 class ImagePublic(ImageBase):
@@ -51,42 +82,324 @@ class ImageUpdate(ImageBase):
     starred: bool = Field(default=False, index=False)
 
 
+# The hot queries are built once, with the album id as a bound parameter, so
+# requests skip constructing the statement and look up its compiled SQL by a
+# cache key that is computed only once.
+album_statement = (
+    sqlmodel.select(Image.album, Image.starred, Image.id)
+    .where(Image.album == sqlalchemy.bindparam("album_id"))
+    .order_by(Image.id)
+)
+# Starred lookups read columns ix_image_album_id does not cover, so SQLite picks the
+# smaller partial ix_image_starred without statistics. The unstar UPDATE in
+# update_starred only does so once ANALYZE has run; see checkpoint_wal.
+starred_filepath_statement = sqlmodel.select(Image.filepath).filter_by(
+    album=sqlalchemy.bindparam("album_id"), starred=sqlalchemy.true()
+)
+# Stars the new image only if its album has no starred image yet. Deciding this
+# within the INSERT keeps concurrent uploads to an album from each starring theirs.
+image_table: sqlalchemy.Table = Image.__table__
+insert_image_statement = (
+    # Built on the table rather than the model: with params, an ORM insert would
+    # be run as a bulk insert of the params themselves.
+    sqlalchemy.insert(image_table)
+    .from_select(
+        ["album", "starred", "filepath"],
+        sqlalchemy.select(
+            sqlalchemy.bindparam("album_id", type_=sqlalchemy.Integer),
+            ~sqlalchemy.exists().where(
+                image_table.c.album == sqlalchemy.bindparam("album_id"),
+                image_table.c.starred == sqlalchemy.true(),
+            ),
+            sqlalchemy.bindparam("filepath", type_=sqlalchemy.String),
+        ),
+    )
+    .returning(image_table.c.id, image_table.c.starred)
+)
+
+
+class ImageFileResponse(fastapi.responses.FileResponse):
+    """A FileResponse that lets the server send the file when it is able to.
+
+    Servers advertising the ASGI "http.response.pathsend" extension (e.g. Hypercorn)
+    copy the file to the socket themselves, typically with sendfile(2), so the image
+    bytes never pass through the event loop.
+    Otherwise, and for HEAD or range requests, FileResponse handles the request,
+    reading the file in a worker thread one chunk at a time. Chunks are 1 MiB
+    rather than FileResponse's 64 KiB, so most images are sent with a handful of
+    thread dispatches instead of dozens.
+    """
+
+    chunk_size = 1024 * 1024
+
+    async def __call__(self, scope, receive, send):
+        if (
+            "http.response.pathsend" not in scope.get("extensions", {})
+            or scope["method"].upper() == "HEAD"
+            or any(key == b"range" for key, _ in scope["headers"])
+        ):
+            await super().__call__(scope, receive, send)
+            return
+
+        try:
+            stat_result = await anyio.to_thread.run_sync(os.stat, self.path)
+        except FileNotFoundError:
+            raise RuntimeError(f"File at path {self.path} does not exist.")
+        self.set_stat_headers(stat_result)
+
+        await send(
+            {
+                "type": "http.response.start",
+                "status": self.status_code,
+                "headers": self.raw_headers,
+            }
+        )
+        await send(
+            {"type": "http.response.pathsend", "path": os.path.abspath(self.path)}
+        )
+
+        if self.background is not None:
+            await self.background()
+
+
 SQLITE_FILE_NAME = "database.db"
-sqlite_url = "sqlite:///" + os.path.join(BASE_DIR, SQLITE_FILE_NAME)
+sqlite_path = os.path.join(BASE_DIR, SQLITE_FILE_NAME)
+sqlite_url = "sqlite+aiosqlite:///" + sqlite_path
+# Connections from this engine open the database read-only, so they never take
+# the write lock; under WAL they read from a snapshot without waiting on writers.
+sqlite_read_url = f"sqlite+aiosqlite:///file:{sqlite_path}?mode=ro&uri=true"
 
 connect_args = {"check_same_thread": False}
-engine = sqlmodel.create_engine(sqlite_url, connect_args=connect_args)
+# aiosqlite defaults to NullPool for file databases, which opens a new
+# connection for every session; keep a pool of connections open instead.
+pool_args = {
+    "poolclass": sqlalchemy.AsyncAdaptedQueuePool,
+    "pool_size": 5,
+    "max_overflow": 10,
+    "pool_pre_ping": True,
+    "pool_recycle": 1800,
+}
+engine = create_async_engine(sqlite_url, connect_args=connect_args, **pool_args)
+read_engine = create_async_engine(
+    sqlite_read_url, connect_args=connect_args, **pool_args
+)
+async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+async_read_session = async_sessionmaker(
+    read_engine, class_=AsyncSession, expire_on_commit=False
+)
+
+
+@sqlalchemy.event.listens_for(read_engine.sync_engine, "connect")
+def set_sqlite_cache_pragmas(dbapi_connection, connection_record):
+    """Configures caching for each new connection; pooled connections keep it."""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA mmap_size=268435456")
+    cursor.execute("PRAGMA cache_size=-65536")
+    cursor.close()
+
+
+@sqlalchemy.event.listens_for(engine.sync_engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Configures each new connection; pooled connections keep these settings.
+
+    WAL lets readers carry on while a write is committed, and synchronous=NORMAL
+    only syncs the WAL at checkpoints rather than on every commit. Automatic
+    checkpoints are turned off, as they would run in whichever request's commit
+    crosses the threshold; see checkpoint_wal.
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA wal_autocheckpoint=0")
+    cursor.close()
+    set_sqlite_cache_pragmas(dbapi_connection, connection_record)
 
 
-def create_db_and_tables():
-    SQLModel.metadata.create_all(engine)
+# Each write here touches a handful of pages (the row and its indexes), so this
+# roughly matches SQLite's default of checkpointing every 1000 WAL pages.
+CHECKPOINT_INTERVAL = 200
+checkpoint_lock = anyio.Lock()
+commits_since_checkpoint = 0
+
+
+async def checkpoint_wal():
+    """Refreshes planner statistics and copies the WAL back into the database file.
+
+    Endpoints that write to the database run this as a background task after each
+    commit, so the checkpoint's fsync happens after the response has been sent.
+    Only every CHECKPOINT_INTERVAL-th commit checkpoints; the rest just count.
+    A checkpoint only copies pages committed before it started, so if one is
+    already running, the count is kept and a later commit checkpoints instead.
+    """
+    global commits_since_checkpoint
+    commits_since_checkpoint += 1
+    if commits_since_checkpoint < CHECKPOINT_INTERVAL or checkpoint_lock.locked():
+        return
+    async with checkpoint_lock, engine.connect() as conn:
+        commits_since_checkpoint = 0
+        # Without statistics, the unstar UPDATE in update_starred scans the whole
+        # album through ix_image_album_id; with them, it uses ix_image_starred.
+        # The starred lookups pick ix_image_starred either way. Refreshing here
+        # keeps the statistics in step with the table's growth, and
+        # analysis_limit keeps ANALYZE to a sample of each index.
+        await conn.exec_driver_sql("PRAGMA analysis_limit=400")
+        await conn.exec_driver_sql("ANALYZE")
+        await conn.exec_driver_sql("PRAGMA wal_checkpoint(PASSIVE)")
+
+
+async def create_db_and_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
 
 
 def create_images_dir():
-    if not os.path.exists(IMAGES_DIR):
-        os.mkdir(IMAGES_DIR)
+    os.makedirs(IMAGES_DIR, exist_ok=True)
+
+
+def upload_filepath(src: BinaryIO, file_ext: str) -> str:
+    """Derives the location of an uploaded file from its SHA-256 digest.
+
+    Identical uploads share a single file. Files are bucketed into subdirectories
+    by the first two hex digits of the digest, which keeps any one directory from
+    growing too large.
+
+    Args:
+        src: the upload's file object
+        file_ext: extension to give the saved file
+
+    Returns:
+        location of the file on disk
+    """
+    src.flush()
+    src.seek(0)
+    digest: str = hashlib.file_digest(src, "sha256").hexdigest()
+    return f"{IMAGES_DIR}/{digest[:2]}/{digest}.{file_ext}"
+
+
+def save_upload(src: BinaryIO, filepath: str) -> None:
+    """Saves an uploaded file at filepath, unless a file is already there.
+
+    A file that is already on disk is not written again. Call this while holding
+    SQLite's write lock, so the file cannot be removed before its row is committed.
+
+    Uploads are spooled to memory or, when large, to a temporary file on disk. On
+    Linux, an upload already on disk is copied by the kernel with sendfile(2);
+    uploads still in memory, and all uploads elsewhere, are copied in chunks.
+
+    Args:
+        src: the upload's file object
+        filepath: location at which to save the file, from upload_filepath
+    """
+    if os.path.exists(filepath):
+        return
+
+    bucket_dir = os.path.dirname(filepath)
+    os.makedirs(bucket_dir, exist_ok=True)
+
+    # Write to a temporary file and rename it, so that a partially written file
+    # never appears under its final name.
+    fd, temp_path = tempfile.mkstemp(suffix=".tmp", dir=bucket_dir)
+    try:
+        with open(fd, "wb") as dst:
+            # Asking a SpooledTemporaryFile still in memory for its fileno() would
+            # first write it out to a temporary file, an extra copy of the upload.
+            in_memory = (
+                isinstance(src, tempfile.SpooledTemporaryFile) and not src._rolled
+            )
+            if sys.platform == "linux" and not in_memory:
+                offset = 0
+                while sent := os.sendfile(
+                    dst.fileno(), src.fileno(), offset, COPY_CHUNK_SIZE
+                ):
+                    offset += sent
+            else:
+                src.seek(0)
+                shutil.copyfileobj(src, dst, COPY_CHUNK_SIZE)
+        os.replace(temp_path, filepath)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+# Rows can share a file, so an upload that finds its file on disk must commit its
+# row before a delete can decide the file is unused and remove it. Both take
+# SQLite's write lock before looking at the file and hold it until they commit.
+# The lock lives in the database, so this also holds across worker processes.
+begin_immediate_statement = sqlalchemy.text("BEGIN IMMEDIATE")
+
+
+async def remove_unused_files(filepaths: Iterable[str]) -> None:
+    """Removes image files from disk that no image refers to any more.
+
+    Args:
+        filepaths: locations of the files to remove if they are unused
+    """
+    async with async_session() as session:
+        await session.exec(begin_immediate_statement)
+        for filepath in filepaths:
+            results = await session.exec(
+                sqlmodel.select(Image.id).filter_by(filepath=filepath).limit(1)
+            )
+            if results.first() is None:
+                with contextlib.suppress(FileNotFoundError):
+                    await anyio.to_thread.run_sync(os.remove, filepath)
+        await session.commit()
 
 
-def get_session():
-    """A FastAPI dependency to yield a Session, which stores objects in memory.
+async def get_session():
+    """A FastAPI dependency to yield an AsyncSession, which stores objects in memory.
 
     Yields:
-        A Session for working with SQL db data.
+        An AsyncSession for working with SQL db data.
     """
-    with sqlmodel.Session(engine) as session:
+    async with async_session() as session:
         yield session
 
 
-SessionDep = Annotated[sqlmodel.Session, fastapi.Depends(get_session)]
+async def get_read_session():
+    """A FastAPI dependency to yield a read-only AsyncSession.
+
+    Yields:
+        An AsyncSession for reading SQL db data.
+    """
+    async with async_read_session() as session:
+        yield session
+
+
+SessionDep = Annotated[AsyncSession, fastapi.Depends(get_session)]
+ReadSessionDep = Annotated[AsyncSession, fastapi.Depends(get_read_session)]
+
+# Albums are read far more often than they are changed, so the results of
+# get_album (as ImagePublic-shaped dicts) and get_starred (the filepath) are cached
+# by album id. Endpoints that change an album invalidate its entries.
+album_cache: cachetools.TTLCache = cachetools.TTLCache(maxsize=1024, ttl=60)
+starred_cache: cachetools.TTLCache = cachetools.TTLCache(maxsize=1024, ttl=60)
+# Counts the changes to all albums. A reader notes the count before querying and
+# only caches its result if the count is unchanged afterwards; otherwise an album
+# changed during the query and the result may already be stale. A single count,
+# rather than one per album, keeps memory bounded however many album ids are used.
+cache_generation = 0
+
+
+def invalidate_album(album_id: int) -> None:
+    """Drops the cached data for an album after it has been changed."""
+    global cache_generation
+    cache_generation += 1
+    album_cache.pop(album_id, None)
+    starred_cache.pop(album_id, None)
 
 
 app = fastapi.FastAPI()
 
-origins = [
-    "http://localhost:5173",
-    "http://localhost:8080",
-    "http://localhost",
-]
+# A frozenset, so CORSMiddleware's origin check is a hash lookup.
+origins = frozenset(
+    {
+        "http://localhost:5173",
+        "http://localhost:8080",
+        "http://localhost",
+    }
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -98,16 +411,19 @@ app.add_middleware(
 
 
 @app.on_event("startup")
-def on_startup():
+async def on_startup():
     """Sets up the database on application startup."""
     # TODO: For production, have a migration script (Alembic).
-    create_db_and_tables()
+    await create_db_and_tables()
     create_images_dir()
 
 
 @app.post("/images/album/{album_id}", response_model=ImagePublic, status_code=201)
 async def create_image(
-    album_id: int, img_upload: fastapi.UploadFile, session: SessionDep
+    album_id: int,
+    img_upload: fastapi.UploadFile,
+    session: SessionDep,
+    background_tasks: fastapi.BackgroundTasks,
 ):
     """Creates an image entry in the database.
 
@@ -125,97 +441,135 @@ async def create_image(
         the image's row data in the database
     """
     # Validate file's media type.
-    try:
-        if not img_upload.content_type.startswith("image"):
-            raise fastapi.HTTPException(status_code=406, detail="Invalid file type")
-    except Exception as err:
-        raise fastapi.HTTPException(status_code=400, detail=f"Invalid upload: {err}")
-
-    # Generate filename from a hash of the file.
-    file_ext: str = img_upload.content_type.split("/")[1]
-    filename: str = secrets.token_hex(8) + "." + file_ext
-    filepath = f"{IMAGES_DIR}/{filename}"
-
-    # Determine whether this album already has a starred image.
-    statement = sqlmodel.select(Image).where(
-        Image.album == album_id and Image.starred is True
+    file_ext: str | None = IMAGE_EXTENSIONS.get(img_upload.content_type)
+    if file_ext is None:
+        raise fastapi.HTTPException(status_code=406, detail="Unsupported image type")
+
+    # Name the image file by a hash of its contents, in a worker thread.
+    filepath: str = await anyio.to_thread.run_sync(
+        upload_filepath, img_upload.file, file_ext
     )
-    starred_results: sqlalchemy.ScalarResult = session.exec(statement)
-    if starred_results.first() is None:
-        star = True
-    else:
-        star = False
 
-    # Create new Image for db entry.
-    new_image: Image = Image(album=album_id, starred=star, filepath=filepath)
+    # Hold the write lock from checking for the file until the row is committed.
+    await session.exec(begin_immediate_statement)
 
-    # Save image file to disk.
-    with open(filepath, "wb+") as f_obj:
-        f_obj.write(img_upload.file.read())
+    # Save image file to disk in a worker thread.
+    await anyio.to_thread.run_sync(save_upload, img_upload.file, filepath)
 
-    # Save to database.
-    session.add(new_image)
-    session.commit()
+    # Save to database, starring the image if the album has no starred image.
+    results = await session.exec(
+        insert_image_statement, params={"album_id": album_id, "filepath": filepath}
+    )
+    image_id, starred = results.one()
+    await session.commit()
+    invalidate_album(album_id)
+    background_tasks.add_task(checkpoint_wal)
 
-    session.refresh(new_image)
-    return new_image
+    # The INSERT returned the generated values, so there is no need to reload the row.
+    return Image(id=image_id, album=album_id, starred=starred, filepath=filepath)
 
 
-@app.get("/images/{image_id}", response_class=fastapi.responses.FileResponse)
-async def get_image(image_id: int, session: SessionDep):
+@app.get("/images/{image_id}", response_class=ImageFileResponse)
+async def get_image(image_id: int, session: ReadSessionDep):
     """Retrieves an image file with the given id."""
-    image = session.get(Image, image_id)
+    image = await session.get(Image, image_id)
     if not image:
         raise fastapi.HTTPException(status_code=404, detail="Image not found")
 
     # Get file extension for media type.
     file_ext = image.filepath.split(".")[-1]
 
-    return fastapi.responses.FileResponse(
-        image.filepath, media_type=f"image/{file_ext}"
-    )
+    return ImageFileResponse(image.filepath, media_type=f"image/{file_ext}")
 
 
 @app.delete("/images/{image_id}", status_code=204)
-async def delete_image(image_id: int, session: SessionDep):
+async def delete_image(
+    image_id: int, session: SessionDep, background_tasks: fastapi.BackgroundTasks
+):
     """Deletes the image with the given ID from the database.
 
+    The image's file is removed from disk after the response has been sent, unless
+    another image uses it.
+
     Args:
         image_id: primary key of the image to delete
         session: database Session
+        background_tasks: tasks to run after the response, used to remove the file
 
     Raises:
         fastapi.HTTPException: throws a 404 when image is not found
-
-    Returns:
-        success message
     """
-    image = session.get(Image, image_id)
+    image = await session.get(Image, image_id)
     if not image:
         raise fastapi.HTTPException(status_code=404, detail="Image not found")
 
-    os.remove(image.filepath)
+    await session.delete(image)
+    await session.commit()
+    invalidate_album(image.album)
 
-    session.delete(image)
-    session.commit()
+    # Remove the file, unless another image uses it, after the response is sent.
+    background_tasks.add_task(remove_unused_files, [image.filepath])
+    background_tasks.add_task(checkpoint_wal)
 
 
-@app.get("/images/album/{album_id}", response_model=list[ImagePublic])
-async def get_album(album_id: int, session: SessionDep) -> list[ImagePublic]:
+@app.delete("/images/album/{album_id}", status_code=204)
+async def delete_album(
+    album_id: int, session: SessionDep, background_tasks: fastapi.BackgroundTasks
+):
+    """Deletes all the images in the album with a single statement.
+
+    The images' files are removed from disk after the response has been sent, except
+    those another image uses.
+
+    Args:
+        album_id: identification of the album from which to delete all images
+        session: database Session
+        background_tasks: tasks to run after the response, used to remove the files
+    """
+    results = await session.exec(
+        sqlmodel.delete(Image).filter_by(album=album_id).returning(Image.filepath)
+    )
+    filepaths: set[str] = set(results.scalars())
+    await session.commit()
+    invalidate_album(album_id)
+
+    # Remove the files, except those other images use, after the response is sent.
+    background_tasks.add_task(remove_unused_files, filepaths)
+    background_tasks.add_task(checkpoint_wal)
+
+
+@app.get(
+    "/images/album/{album_id}",
+    response_model=list[ImagePublic],
+    response_class=fastapi.responses.ORJSONResponse,
+)
+async def get_album(
+    album_id: int, session: ReadSessionDep
+) -> fastapi.responses.ORJSONResponse:
     """Returns all the images in the album along with their IDs.
 
+    The response is built directly from the selected columns, bypassing
+    response_model validation; response_model only documents the schema.
+
     Args:
         album_id: identification of the album from which to retrieve images
     """
-    images = session.exec(sqlmodel.select(Image).where(Image.album == album_id))
-    return images
+    images = album_cache.get(album_id)
+    if images is None:
+        generation = cache_generation
+        results = await session.exec(album_statement, params={"album_id": album_id})
+        images = [row._asdict() for row in results]
+        if cache_generation == generation:
+            album_cache[album_id] = images
+
+    return fastapi.responses.ORJSONResponse(images)
 
 
 @app.get(
     "/images/album/{album_id}/starred",
-    response_class=fastapi.responses.FileResponse,
+    response_class=ImageFileResponse,
 )
-async def get_starred(album_id: int, session: SessionDep):
+async def get_starred(album_id: int, session: ReadSessionDep):
     """Returns the starred image in the identified album.
 
     Args:
@@ -224,49 +578,60 @@ async def get_starred(album_id: int, session: SessionDep):
     Returns:
         image file requested
     """
-    # Execute query for the album's starred Image
-    statement = sqlmodel.select(Image).filter_by(album=album_id, starred=True)
-    img_entry: sqlalchemy.ScalarResult = session.exec(statement).first()
-    if img_entry is None:
-        raise fastapi.HTTPException(status_code=404, detail="No starred image found")
+    filepath: str | None = starred_cache.get(album_id)
+    if filepath is None:
+        generation = cache_generation
+        # Execute query for the album's starred Image
+        results = await session.exec(
+            starred_filepath_statement, params={"album_id": album_id}
+        )
+        filepath = results.first()
+        if filepath is None:
+            raise fastapi.HTTPException(
+                status_code=404, detail="No starred image found"
+            )
+        if cache_generation == generation:
+            starred_cache[album_id] = filepath
 
     # Get file extension for media type.
-    file_ext = img_entry.filepath.split(".")[-1]
+    file_ext = filepath.split(".")[-1]
 
-    return fastapi.responses.FileResponse(
-        img_entry.filepath, media_type=f"image/{file_ext}"
-    )
+    return ImageFileResponse(filepath, media_type=f"image/{file_ext}")
 
 
 @app.patch("/images/album/{album_id}/starred", status_code=204)
-async def update_starred(album_id: int, image_id: int, session: SessionDep):
+async def update_starred(
+    album_id: int,
+    image_id: int,
+    session: SessionDep,
+    background_tasks: fastapi.BackgroundTasks,
+):
     """Stars the image with the given id for the album.
 
     Args:
         album_id: identification of the album having an image set as starred
         image_id: identification of the image to star
     """
-    # Retrieve the image to star to ensure it exists.
-    image: Image = session.get(Image, image_id)
-    if not image or image.album != album_id:
+    # Unstar the album's currently starred image (if any), then star the image.
+    # Both updates are committed together in a single transaction.
+    await session.exec(
+        sqlmodel.update(Image)
+        .filter_by(album=album_id, starred=sqlalchemy.true())
+        .where(Image.id != image_id)
+        .values(starred=False)
+    )
+    results = await session.exec(
+        sqlmodel.update(Image)
+        .filter_by(id=image_id, album=album_id)
+        .values(starred=True)
+    )
+    if results.rowcount == 0:
+        await session.rollback()
         raise fastapi.HTTPException(status_code=404, detail="Image not found")
 
-    # Retrieve currently starred image (if any).
-    statement = sqlmodel.select(Image).filter_by(album=album_id, starred=True)
-    results: sqlalchemy.ScalarResult = session.exec(statement)
-    prev_starred: Image = results.first()
-
-    prev_starred.sqlmodel_update({"starred": False})
-    session.add(prev_starred)
-    session.commit()
-    session.refresh(prev_starred)
-
-    # Star the image.
-    image.sqlmodel_update({"starred": True})
-    session.add(image)
-
     # Commit changes to database.
-    session.commit()
-    session.refresh(image)
+    await session.commit()
+    invalidate_album(album_id)
+    background_tasks.add_task(checkpoint_wal)
 
     return {"ok": True}